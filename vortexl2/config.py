@@ -2,17 +2,103 @@
 VortexL2 Configuration Management
 
 Handles loading/saving multiple tunnel configurations from /etc/vortexl2/tunnels/
-Each tunnel has its own YAML config file.
+Each tunnel has its own config file (JSON, or YAML for older installs).
 """
 
+import atexit
+import json
 import os
 import yaml
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+
+# Prefer the libyaml-backed loader/dumper when available
+try:
+    from yaml import CSafeLoader as _SafeLoader, CSafeDumper as _SafeDumper
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader, SafeDumper as _SafeDumper
 
 
 CONFIG_DIR = Path("/etc/vortexl2")
 TUNNELS_DIR = CONFIG_DIR / "tunnels"
+INDEX_FILE = CONFIG_DIR / "index.state"
+
+# Save configs as JSON (C-accelerated in CPython). YAML files from older
+# versions are still read, and are replaced by JSON on their next save.
+_USE_JSON = True
+_CONFIG_EXTENSIONS = (".json", ".yaml")
+
+
+# Set once TUNNELS_DIR is known to exist, so repeated saves skip mkdir
+_dirs_ready = False
+
+
+def _ensure_dirs() -> None:
+    """Create the config directories once per process."""
+    global _dirs_ready
+    if _dirs_ready:
+        return
+    TUNNELS_DIR.mkdir(parents=True, exist_ok=True)
+    _dirs_ready = True
+
+
+# Configs with unsaved changes; written out at interpreter exit
+_pending_configs = set()
+
+
+def _flush_pending() -> None:
+    """Write every config that still has unsaved changes."""
+    for config in list(_pending_configs):
+        config.flush()
+
+
+atexit.register(_flush_pending)
+
+
+def _read_index() -> Optional[Dict[str, int]]:
+    """Read the tunnel name -> interface index map, or None if missing/unreadable."""
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def _write_index(index: Dict[str, int]) -> None:
+    """Atomically replace the interface index file."""
+    _ensure_dirs()
+    tmp_path = INDEX_FILE.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_FILE)
+
+
+def _update_index(name: str, interface_index: Optional[int]) -> None:
+    """
+    Record (or with None, forget) a tunnel's interface index.
+    
+    Only an existing index is updated; a missing one is rebuilt from a full
+    scan by ConfigManager.create_tunnel, so it is never partially populated.
+    """
+    index = _read_index()
+    if index is None or index.get(name) == interface_index:
+        return
+    if interface_index is None:
+        del index[name]
+    else:
+        index[name] = interface_index
+    _write_index(index)
+
+
+def _find_config_file(name: str) -> Optional[Path]:
+    """Return the existing config file for a tunnel, preferring JSON over YAML."""
+    for ext in _CONFIG_EXTENSIONS:
+        path = TUNNELS_DIR / f"{name}{ext}"
+        if path.exists():
+            return path
+    return None
 
 
 class TunnelConfig:
@@ -36,8 +122,10 @@ class TunnelConfig:
     def __init__(self, name: str, config_data: Dict[str, Any] = None, auto_save: bool = True):
         self._name = name
         self._config: Dict[str, Any] = {}
-        self._file_path = TUNNELS_DIR / f"{name}.yaml"
+        self._file_path = TUNNELS_DIR / f"{name}{'.json' if _USE_JSON else '.yaml'}"
         self._auto_save = auto_save
+        self._dirty = False
+        self._ports_set: Optional[set] = None  # mirror of forwarded_ports for O(1) lookups
         
         if config_data:
             self._config = config_data
@@ -47,47 +135,114 @@ class TunnelConfig:
         # Apply defaults for missing keys
         for key, default in self.DEFAULTS.items():
             if key not in self._config:
-                self._config[key] = default
+                # Copy mutable defaults so instances never share a list
+                self._config[key] = list(default) if isinstance(default, list) else default
         
         # Ensure name matches
         self._config["name"] = name
     
     def _load(self) -> None:
         """Load configuration from file."""
-        if self._file_path.exists():
+        path = _find_config_file(self._name)
+        if path is not None:
             try:
-                with open(self._file_path, 'r') as f:
-                    self._config = yaml.safe_load(f) or {}
+                with open(path, 'r') as f:
+                    if path.suffix == ".json":
+                        self._config = json.load(f) or {}
+                    else:
+                        # Drive the loader directly instead of via yaml.load()
+                        loader = _SafeLoader(f)
+                        try:
+                            self._config = loader.get_single_data() or {}
+                        finally:
+                            loader.dispose()
             except Exception:
                 self._config = {}
     
-    def _save(self) -> None:
-        """Save configuration to file if auto_save is enabled."""
-        if not self._auto_save:
-            return
-        TUNNELS_DIR.mkdir(parents=True, exist_ok=True)
+    def _write(self) -> None:
+        """Serialize configuration to disk."""
+        _ensure_dirs()
+        
+        # Create with 0600 directly; fchmod covers files that already existed
+        fd = os.open(self._file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            if _USE_JSON:
+                json.dump(self._config, f, indent=2)
+            else:
+                yaml.dump(self._config, f, Dumper=_SafeDumper, default_flow_style=False)
+        self._dirty = False
+        _pending_configs.discard(self)
         
-        with open(self._file_path, 'w') as f:
-            yaml.dump(self._config, f, default_flow_style=False)
+        # Drop the config in the other format so the two can't diverge
+        for ext in _CONFIG_EXTENSIONS:
+            stale = TUNNELS_DIR / f"{self._name}{ext}"
+            if stale != self._file_path and stale.exists():
+                stale.unlink()
         
-        os.chmod(self._file_path, 0o600)
+        _update_index(self._name, self.interface_index)
+    
+    def _save(self) -> None:
+        """
+        Schedule a save if auto_save is enabled and something changed.
+        
+        The write itself is deferred to flush() (or interpreter exit), so a
+        run of setter calls costs a single serialization.
+        """
+        if not self._auto_save or not self._dirty:
+            return
+        _pending_configs.add(self)
+    
+    def flush(self) -> None:
+        """Write pending changes to disk now (if auto_save is enabled)."""
+        if self._auto_save and self._dirty:
+            self._write()
     
     def save(self) -> None:
         """Public method to force save configuration (ignores auto_save)."""
-        TUNNELS_DIR.mkdir(parents=True, exist_ok=True)
-        
-        with open(self._file_path, 'w') as f:
-            yaml.dump(self._config, f, default_flow_style=False)
-        
-        os.chmod(self._file_path, 0o600)
+        self._write()
         self._auto_save = True  # Enable auto_save after manual save
     
+    @contextmanager
+    def batch(self):
+        """
+        Group several attribute updates into a single save.
+        
+        Setters inside the block only update the in-memory config; one write
+        happens on exit (if auto_save is enabled and something changed).
+        """
+        previous = self._auto_save
+        self._auto_save = False
+        try:
+            yield self
+        finally:
+            self._auto_save = previous
+            self.flush()
+    
+    def _set(self, key: str, value: Any) -> None:
+        """Update a config value, marking dirty and scheduling a save only on change."""
+        # Lists/dicts may have been mutated in place, so only trust equality for immutable values
+        if key in self._config and not isinstance(value, (list, dict)) and self._config[key] == value:
+            return
+        self._config[key] = value
+        self._dirty = True
+        self._save()
+    
     def delete(self) -> bool:
         """Delete this tunnel's config file."""
-        if self._file_path.exists():
-            self._file_path.unlink()
-            return True
-        return False
+        # Pending changes must not recreate the file at exit
+        self._dirty = False
+        _pending_configs.discard(self)
+        
+        deleted = False
+        for ext in _CONFIG_EXTENSIONS:
+            path = TUNNELS_DIR / f"{self._name}{ext}"
+            if path.exists():
+                path.unlink()
+                deleted = True
+        
+        _update_index(self._name, None)
+        return deleted
     
     @property
     def name(self) -> str:
@@ -95,8 +250,7 @@ class TunnelConfig:
     
     @name.setter
     def name(self, value: str) -> None:
-        self._config["name"] = value
-        self._save()
+        self._set("name", value)
     
     @property
     def local_ip(self) -> Optional[str]:
@@ -104,8 +258,7 @@ class TunnelConfig:
     
     @local_ip.setter
     def local_ip(self, value: str) -> None:
-        self._config["local_ip"] = value
-        self._save()
+        self._set("local_ip", value)
     
     @property
     def remote_ip(self) -> Optional[str]:
@@ -113,8 +266,7 @@ class TunnelConfig:
     
     @remote_ip.setter
     def remote_ip(self, value: str) -> None:
-        self._config["remote_ip"] = value
-        self._save()
+        self._set("remote_ip", value)
     
     @property
     def interface_ip(self) -> str:
@@ -122,8 +274,7 @@ class TunnelConfig:
     
     @interface_ip.setter
     def interface_ip(self, value: str) -> None:
-        self._config["interface_ip"] = value
-        self._save()
+        self._set("interface_ip", value)
     
     @property
     def remote_forward_ip(self) -> str:
@@ -131,8 +282,7 @@ class TunnelConfig:
     
     @remote_forward_ip.setter
     def remote_forward_ip(self, value: str) -> None:
-        self._config["remote_forward_ip"] = value
-        self._save()
+        self._set("remote_forward_ip", value)
     
     @property
     def tunnel_id(self) -> int:
@@ -140,8 +290,7 @@ class TunnelConfig:
     
     @tunnel_id.setter
     def tunnel_id(self, value: int) -> None:
-        self._config["tunnel_id"] = value
-        self._save()
+        self._set("tunnel_id", value)
     
     @property
     def peer_tunnel_id(self) -> int:
@@ -149,8 +298,7 @@ class TunnelConfig:
     
     @peer_tunnel_id.setter
     def peer_tunnel_id(self, value: int) -> None:
-        self._config["peer_tunnel_id"] = value
-        self._save()
+        self._set("peer_tunnel_id", value)
     
     @property
     def session_id(self) -> int:
@@ -158,8 +306,7 @@ class TunnelConfig:
     
     @session_id.setter
     def session_id(self, value: int) -> None:
-        self._config["session_id"] = value
-        self._save()
+        self._set("session_id", value)
     
     @property
     def peer_session_id(self) -> int:
@@ -167,8 +314,7 @@ class TunnelConfig:
     
     @peer_session_id.setter
     def peer_session_id(self, value: int) -> None:
-        self._config["peer_session_id"] = value
-        self._save()
+        self._set("peer_session_id", value)
     
     @property
     def interface_index(self) -> int:
@@ -176,8 +322,7 @@ class TunnelConfig:
     
     @interface_index.setter
     def interface_index(self, value: int) -> None:
-        self._config["interface_index"] = value
-        self._save()
+        self._set("interface_index", value)
     
     @property
     def interface_name(self) -> str:
@@ -186,12 +331,13 @@ class TunnelConfig:
     
     @property
     def forwarded_ports(self) -> List[int]:
-        return self._config.get("forwarded_ports", [])
+        # Hand out a copy so the list only changes through add_port/remove_port/the setter
+        return list(self._config.get("forwarded_ports", []))
     
     @forwarded_ports.setter
     def forwarded_ports(self, value: List[int]) -> None:
-        self._config["forwarded_ports"] = value
-        self._save()
+        self._ports_set = None
+        self._set("forwarded_ports", value)
     
     def get_tunnel_ids(self) -> Dict[str, int]:
         """Get all tunnel IDs as a dictionary."""
@@ -202,19 +348,29 @@ class TunnelConfig:
             "peer_session_id": self.peer_session_id,
         }
     
+    def _port_set(self) -> set:
+        """Get the set of forwarded ports, building it on first use."""
+        if self._ports_set is None:
+            self._ports_set = set(self.forwarded_ports)
+        return self._ports_set
+    
     def add_port(self, port: int) -> None:
         """Add a port to forwarded ports list."""
-        ports = self.forwarded_ports
+        ports = self._port_set()
         if port not in ports:
-            ports.append(port)
-            self.forwarded_ports = ports
+            ports.add(port)
+            self._config["forwarded_ports"].append(port)
+            self._dirty = True
+            self._save()
     
     def remove_port(self, port: int) -> None:
         """Remove a port from forwarded ports list."""
-        ports = self.forwarded_ports
+        ports = self._port_set()
         if port in ports:
-            ports.remove(port)
-            self.forwarded_ports = ports
+            ports.discard(port)
+            self._config["forwarded_ports"].remove(port)
+            self._dirty = True
+            self._save()
     
     def is_configured(self) -> bool:
         """Check if basic configuration is complete."""
@@ -229,39 +385,74 @@ class ConfigManager:
     """Manages multiple tunnel configurations."""
     
     def __init__(self):
+        # name -> (st_mtime_ns, parsed config); avoids re-parsing unchanged files
+        self._cache: Dict[str, Tuple[int, TunnelConfig]] = {}
         self._ensure_dirs()
     
     def _ensure_dirs(self) -> None:
         """Ensure config directories exist."""
-        TUNNELS_DIR.mkdir(parents=True, exist_ok=True)
+        _ensure_dirs()
     
     def list_tunnels(self) -> List[str]:
         """List all configured tunnel names."""
-        if not TUNNELS_DIR.exists():
+        # scandir gets the file type from the directory read, no per-entry stat
+        try:
+            with os.scandir(TUNNELS_DIR) as entries:
+                return sorted({
+                    os.path.splitext(e.name)[0]  # filename without extension
+                    for e in entries
+                    if e.name.endswith(_CONFIG_EXTENSIONS) and e.is_file(follow_symlinks=False)
+                })
+        except FileNotFoundError:
             return []
+    
+    def _load_cached(self, name: str) -> Optional[TunnelConfig]:
+        """Return the tunnel config for name, re-parsing only if its file changed."""
+        path = _find_config_file(name)
+        try:
+            if path is None:
+                raise FileNotFoundError(name)
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._cache.pop(name, None)
+            return None
         
-        tunnels = []
-        for f in TUNNELS_DIR.glob("*.yaml"):
-            tunnels.append(f.stem)  # filename without extension
-        return sorted(tunnels)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        tunnel = TunnelConfig(name)
+        self._cache[name] = (mtime, tunnel)
+        return tunnel
     
     def get_tunnel(self, name: str) -> Optional[TunnelConfig]:
         """Get a tunnel config by name."""
-        file_path = TUNNELS_DIR / f"{name}.yaml"
-        if file_path.exists():
-            return TunnelConfig(name)
-        return None
+        return self._load_cached(name)
     
     def get_all_tunnels(self) -> List[TunnelConfig]:
         """Get all tunnel configurations."""
-        return [TunnelConfig(name) for name in self.list_tunnels()]
+        tunnels = []
+        for name in self.list_tunnels():
+            tunnel = self._load_cached(name)
+            if tunnel is not None:
+                tunnels.append(tunnel)
+        return tunnels
     
     def create_tunnel(self, name: str) -> TunnelConfig:
         """Create a new tunnel config in memory (not saved until explicitly called)."""
-        # Find next available interface index
-        used_indices = set()
-        for tunnel in self.get_all_tunnels():
-            used_indices.add(tunnel.interface_index)
+        # Find next available interface index from the index file, falling
+        # back to scanning every config when it is missing or doesn't cover
+        # exactly the configs on disk (first run / migration / restored files)
+        index = _read_index()
+        names = self.list_tunnels()
+        if index is None or set(index) != set(names):
+            index = {}
+            for tunnel_name in names:
+                tunnel = self._load_cached(tunnel_name)
+                if tunnel is not None:
+                    index[tunnel_name] = tunnel.interface_index
+            _write_index(index)
+        used_indices = set(index.values())
         
         # Find first available index
         new_index = 0
@@ -270,16 +461,18 @@ class ConfigManager:
         
         # Create new tunnel config (auto_save=False means no file created yet)
         tunnel = TunnelConfig(name, auto_save=False)
-        tunnel._config["interface_index"] = new_index
-        tunnel._config["name"] = name
-        
-        # Set unique default tunnel IDs based on index
-        # This helps avoid ID conflicts between tunnels
         base_tunnel_id = 1000 + (new_index * 100)
-        tunnel._config["tunnel_id"] = base_tunnel_id
-        tunnel._config["peer_tunnel_id"] = base_tunnel_id + 1000
-        tunnel._config["session_id"] = 10 + new_index
-        tunnel._config["peer_session_id"] = 20 + new_index
+        
+        with tunnel.batch():
+            tunnel.interface_index = new_index
+            tunnel.name = name
+            
+            # Set unique default tunnel IDs based on index
+            # This helps avoid ID conflicts between tunnels
+            tunnel.tunnel_id = base_tunnel_id
+            tunnel.peer_tunnel_id = base_tunnel_id + 1000
+            tunnel.session_id = 10 + new_index
+            tunnel.peer_session_id = 20 + new_index
         
         # Don't save here - config file will be created only after successful tunnel setup
         return tunnel
@@ -287,11 +480,12 @@ class ConfigManager:
     def delete_tunnel(self, name: str) -> bool:
         """Delete a tunnel configuration."""
         tunnel = self.get_tunnel(name)
+        self._cache.pop(name, None)
         if tunnel:
             return tunnel.delete()
         return False
     
     def tunnel_exists(self, name: str) -> bool:
         """Check if a tunnel with this name exists."""
-        return (TUNNELS_DIR / f"{name}.yaml").exists()
+        return _find_config_file(name) is not None
 
@@ -7,12 +7,19 @@ Each port forward gets its own service file with the correct remote IP.
 
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional
 
 
 SYSTEMD_DIR = Path("/etc/systemd/system")
 
+# systemctl error fragments meaning the unit is not there to stop
+_UNIT_MISSING_MARKERS = ("does not exist", "not found", "not loaded")
+
+# Upper bound on concurrent systemctl processes for per-unit queries
+MAX_WORKERS = 32
+
 # Service file template - one per port (not a systemd template anymore)
 SERVICE_TEMPLATE = """[Unit]
 Description=VortexL2 Port Forward - Port {port}
@@ -29,13 +36,21 @@ RestartSec=5
 WantedBy=multi-user.target
 """
 
+# %-style version of the template, converted once at import so rendering a
+# unit in a loop doesn't re-parse the format string each time
+_SERVICE_FMT = (
+    SERVICE_TEMPLATE
+    .replace("{port}", "%(port)s")
+    .replace("{remote_ip}", "%(remote_ip)s")
+)
+
 
-def run_command(cmd: str) -> Tuple[bool, str]:
-    """Execute a shell command and return (success, output)."""
+def run_command(argv: List[str]) -> Tuple[bool, str]:
+    """Execute a command (argv list, no shell) and return (success, output)."""
     try:
         result = subprocess.run(
-            cmd,
-            shell=True,
+            argv,
+            shell=False,
             capture_output=True,
             text=True,
             timeout=30
@@ -51,112 +66,292 @@ class ForwardManager:
     
     def __init__(self, config):
         self.config = config
+        self._reload_pending = False
+        # Memoized per-port service names/paths, used heavily in the *_all loops
+        self._service_names: Dict[int, str] = {}
+        self._service_paths: Dict[int, Path] = {}
     
     def _get_service_name(self, port: int) -> str:
         """Get systemd service name for a port."""
-        return f"vortexl2-fwd-{port}.service"
+        name = self._service_names.get(port)
+        if name is None:
+            name = self._service_names[port] = f"vortexl2-fwd-{port}.service"
+        return name
     
     def _get_service_path(self, port: int) -> Path:
         """Get path to the service file for a port."""
-        return SYSTEMD_DIR / self._get_service_name(port)
+        path = self._service_paths.get(port)
+        if path is None:
+            path = self._service_paths[port] = SYSTEMD_DIR / self._get_service_name(port)
+        return path
+    
+    def _systemctl(self, verb: str, services: List[str]) -> Tuple[bool, str]:
+        """Run a single systemctl invocation (verb may include flags) covering all given services."""
+        return run_command(["systemctl", *verb.split(), *services])
+    
+    def _systemctl_ports(self, verb: str, ports: List[int]) -> Dict[int, Tuple[bool, str]]:
+        """
+        Run one batched systemctl call for all ports.
+        
+        If the batched call fails, retry per port so each error can be
+        attributed to the unit that caused it.
+        """
+        services = [self._get_service_name(port) for port in ports]
+        success, output = self._systemctl(verb, services)
+        if success:
+            return {port: (True, output) for port in ports}
+        return self._systemctl_each(verb, ports)
+    
+    def _systemctl_each(self, verb: str, ports: List[int]) -> Dict[int, Tuple[bool, str]]:
+        """Run systemctl separately for each port, concurrently."""
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(ports))) as pool:
+            outputs = pool.map(
+                lambda port: self._systemctl(verb, [self._get_service_name(port)]),
+                ports
+            )
+            return dict(zip(ports, outputs))
+    
+    def _unit_missing(self, port: int, output: str) -> bool:
+        """Check whether a failed systemctl call failed because the unit does not exist."""
+        if not self._get_service_path(port).exists():
+            return True
+        output = output.lower()
+        return any(marker in output for marker in _UNIT_MISSING_MARKERS)
+    
+    def _write_service_file(self, port: int, remote_ip: str) -> bool:
+        """
+        Write the systemd unit file for a port.
+        
+        The file is replaced atomically and left untouched when its content
+        is already current. Returns True if the file changed (i.e. systemd
+        needs a daemon-reload).
+        """
+        service_path = self._get_service_path(port)
+        content = (_SERVICE_FMT % {"port": port, "remote_ip": remote_ip}).encode()
+        
+        try:
+            if service_path.read_bytes() == content:
+                return False
+        except FileNotFoundError:
+            pass
+        
+        tmp_path = service_path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, content)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.rename(tmp_path, service_path)
+        self._reload_pending = True
+        return True
+    
+    def _daemon_reload(self) -> None:
+        """Run systemctl daemon-reload if any unit file changed since the last reload."""
+        if self._reload_pending:
+            run_command(["systemctl", "daemon-reload"])
+            self._reload_pending = False
     
-    def create_forward(self, port: int) -> Tuple[bool, str]:
-        """Create and start a port forward service."""
+    @staticmethod
+    def _parse_ports(ports_str: str) -> Tuple[List[Tuple[str, Optional[int]]], List[int]]:
+        """
+        Parse a comma-separated port string.
+        
+        Returns (entries, ports): every non-empty entry in input order paired
+        with its port number (None if invalid), and the unique valid ports.
+        """
+        entries = []
+        for port_str in (p.strip() for p in ports_str.split(',')):
+            if not port_str:
+                continue
+            try:
+                entries.append((port_str, int(port_str)))
+            except ValueError:
+                entries.append((port_str, None))
+        ports = list(dict.fromkeys(port for _, port in entries if port is not None))
+        return entries, ports
+    
+    @staticmethod
+    def _format_results(entries: List[Tuple[str, Optional[int]]], messages: Dict[int, str]) -> str:
+        """Join per-port messages in the order the ports were entered."""
+        return "\n".join(
+            f"Port {port}: {messages[port]}" if port is not None
+            else f"Port '{port_str}': Invalid port number"
+            for port_str, port in entries
+        )
+    
+    def create_forward(self, port: int, *, _defer_reload: bool = False) -> Tuple[bool, str]:
+        """
+        Create and start a port forward service.
+        
+        With _defer_reload, only the service file is written; the caller is
+        responsible for daemon-reload, starting the unit and updating config,
+        so these can be batched across ports.
+        """
         remote_ip = self.config.remote_forward_ip
         if not remote_ip:
             return False, "Remote forward IP not configured"
         
-        service_path = self._get_service_path(port)
         service_name = self._get_service_name(port)
         
         # Create service file with correct remote IP
-        service_content = SERVICE_TEMPLATE.format(port=port, remote_ip=remote_ip)
-        
         try:
-            with open(service_path, 'w') as f:
-                f.write(service_content)
+            self._write_service_file(port, remote_ip)
         except Exception as e:
             return False, f"Failed to create service file: {e}"
         
-        # Reload systemd
-        run_command("systemctl daemon-reload")
+        if _defer_reload:
+            return True, f"Service file for {port} written"
+        
+        # Reload systemd (only needed if the unit file changed)
+        self._daemon_reload()
         
         # Enable and start the service
-        success, output = run_command(f"systemctl enable --now {service_name}")
+        success, output = self._systemctl("enable --now", [service_name])
         if not success:
             return False, f"Failed to start forward for port {port}: {output}"
         
-        # Add to config
+        # Add to config, persisting now since the unit is already running
         self.config.add_port(port)
+        self.config.flush()
         
         return True, f"Port forward for {port} created (-> {remote_ip}:{port})"
     
-    def remove_forward(self, port: int) -> Tuple[bool, str]:
-        """Stop, disable and remove a port forward service."""
+    def remove_forward(self, port: int, *, _defer_reload: bool = False) -> Tuple[bool, str]:
+        """
+        Stop, disable and remove a port forward service.
+        
+        With _defer_reload, the caller has already stopped/disabled the unit
+        and will run daemon-reload itself, so these can be batched across ports.
+        """
         service_name = self._get_service_name(port)
         service_path = self._get_service_path(port)
         
         # Stop and disable
-        run_command(f"systemctl stop {service_name}")
-        run_command(f"systemctl disable {service_name}")
+        if not _defer_reload:
+            self._systemctl("stop", [service_name])
+            self._systemctl("disable", [service_name])
         
         # Remove service file
         if service_path.exists():
             service_path.unlink()
+            self._reload_pending = True
         
         # Reload systemd
-        run_command("systemctl daemon-reload")
+        if not _defer_reload:
+            self._daemon_reload()
         
-        # Remove from config
+        # Remove from config, persisting now since the unit file is already gone
         self.config.remove_port(port)
+        self.config.flush()
         
         return True, f"Port forward for {port} removed"
     
     def add_multiple_forwards(self, ports_str: str) -> Tuple[bool, str]:
         """Add multiple port forwards from comma-separated string."""
-        results = []
-        ports = [p.strip() for p in ports_str.split(',') if p.strip()]
+        messages = {}
+        entries, ports = self._parse_ports(ports_str)
+        remote_ip = self.config.remote_forward_ip
         
-        for port_str in ports:
-            try:
-                port = int(port_str)
-                success, msg = self.create_forward(port)
-                results.append(f"Port {port}: {msg}")
-            except ValueError:
-                results.append(f"Port '{port_str}': Invalid port number")
+        # Write all unit files first, then reload and start them in one go
+        written = []
+        for port in ports:
+            success, msg = self.create_forward(port, _defer_reload=True)
+            if success:
+                written.append(port)
+            else:
+                messages[port] = msg
         
-        return True, "\n".join(results)
+        if written:
+            self._daemon_reload()
+            
+            outcome = self._systemctl_ports("enable --now", written)
+            
+            with self.config.batch():
+                for port in written:
+                    success, output = outcome[port]
+                    if success:
+                        self.config.add_port(port)
+                        messages[port] = f"Port forward for {port} created (-> {remote_ip}:{port})"
+                    else:
+                        messages[port] = f"Failed to start forward for port {port}: {output}"
+        
+        return True, self._format_results(entries, messages)
     
     def remove_multiple_forwards(self, ports_str: str) -> Tuple[bool, str]:
         """Remove multiple port forwards from comma-separated string."""
-        results = []
-        ports = [p.strip() for p in ports_str.split(',') if p.strip()]
+        messages = {}
+        entries, ports = self._parse_ports(ports_str)
         
-        for port_str in ports:
-            try:
-                port = int(port_str)
-                success, msg = self.remove_forward(port)
-                results.append(f"Port {port}: {msg}")
-            except ValueError:
-                results.append(f"Port '{port_str}': Invalid port number")
+        if ports:
+            # Stop and disable every unit in a single systemctl call
+            outcome = self._systemctl_ports("disable --now", ports)
+            
+            # Only drop unit files/config entries for units that actually stopped;
+            # a unit that no longer exists counts as stopped
+            with self.config.batch():
+                for port in ports:
+                    success, output = outcome[port]
+                    if success or self._unit_missing(port, output):
+                        success, messages[port] = self.remove_forward(port, _defer_reload=True)
+                    else:
+                        messages[port] = f"Failed to stop forward for port {port}: {output}"
+            
+            self._daemon_reload()
         
-        return True, "\n".join(results)
+        return True, self._format_results(entries, messages)
+    
+    def _unit_states(self, ports: List[int]) -> Dict[int, Tuple[str, str]]:
+        """Get (active state, enabled state) for each port's service."""
+        # One `systemctl show` call returns a blank-line separated block per
+        # unit; Id lets each block be matched to its unit regardless of order
+        services = [self._get_service_name(port) for port in ports]
+        success, output = run_command([
+            "systemctl", "show",
+            "--property=Id", "--property=ActiveState", "--property=UnitFileState",
+            "--", *services,
+        ])
+        
+        units = {}
+        if success:
+            for block in output.split("\n\n"):
+                props = {}
+                for line in block.splitlines():
+                    key, _, value = line.partition("=")
+                    props[key] = value
+                units[props.get("Id")] = props
+        
+        if all(service in units for service in services):
+            return {
+                port: (
+                    units[service].get("ActiveState") or "inactive",
+                    units[service].get("UnitFileState") or "disabled",
+                )
+                for port, service in zip(ports, services)
+            }
+        
+        # Fall back to per-unit is-active/is-enabled queries
+        active = self._systemctl_each("is-active", ports)
+        enabled = self._systemctl_each("is-enabled", ports)
+        return {
+            port: (
+                active[port][1] if active[port][0] else "inactive",
+                enabled[port][1] if enabled[port][0] else "disabled",
+            )
+            for port in ports
+        }
     
     def list_forwards(self) -> List[Dict]:
         """List all configured port forwards with their status."""
-        forwards = []
+        ports = list(self.config.forwarded_ports)
+        if not ports:
+            return []
         
-        for port in self.config.forwarded_ports:
-            service_name = self._get_service_name(port)
-            
-            # Check service status
-            success, output = run_command(f"systemctl is-active {service_name}")
-            status = output if success else "inactive"
-            
-            # Check if enabled
-            success, output = run_command(f"systemctl is-enabled {service_name}")
-            enabled = output if success else "disabled"
-            
+        states = self._unit_states(ports)
+        
+        forwards = []
+        for port in ports:
+            status, enabled = states[port]
             forwards.append({
                 "port": port,
                 "status": status,
@@ -169,17 +364,21 @@ class ForwardManager:
     def start_all_forwards(self) -> Tuple[bool, str]:
         """Start all configured port forwards."""
         results = []
+        existing = []
         
-        for port in self.config.forwarded_ports:
-            service_name = self._get_service_name(port)
-            service_path = self._get_service_path(port)
-            
+        for port in list(self.config.forwarded_ports):
             # If service file doesn't exist, recreate it
-            if not service_path.exists():
+            if not self._get_service_path(port).exists():
                 success, msg = self.create_forward(port)
                 results.append(f"Port {port}: recreated and started")
             else:
-                success, output = run_command(f"systemctl start {service_name}")
+                existing.append(port)
+        
+        if existing:
+            outcome = self._systemctl_ports("start", existing)
+            
+            for port in existing:
+                success, output = outcome[port]
                 if success:
                     results.append(f"Port {port}: started")
                 else:
@@ -192,43 +391,45 @@ class ForwardManager:
     
     def stop_all_forwards(self) -> Tuple[bool, str]:
         """Stop all configured port forwards."""
-        results = []
+        ports = list(self.config.forwarded_ports)
+        if not ports:
+            return True, "No port forwards configured"
         
-        for port in self.config.forwarded_ports:
-            service_name = self._get_service_name(port)
-            success, output = run_command(f"systemctl stop {service_name}")
+        outcome = self._systemctl_ports("stop", ports)
+        
+        results = []
+        for port in ports:
+            success, output = outcome[port]
             if success:
                 results.append(f"Port {port}: stopped")
             else:
                 results.append(f"Port {port}: failed to stop - {output}")
         
-        if not results:
-            return True, "No port forwards configured"
-        
         return True, "\n".join(results)
     
     def restart_all_forwards(self) -> Tuple[bool, str]:
         """Restart all configured port forwards."""
         results = []
+        existing = []
+        remote_ip = self.config.remote_forward_ip
         
-        for port in self.config.forwarded_ports:
-            service_name = self._get_service_name(port)
-            service_path = self._get_service_path(port)
-            
+        for port in list(self.config.forwarded_ports):
             # If service file doesn't exist or IP changed, recreate it
-            if not service_path.exists():
+            if not self._get_service_path(port).exists():
                 success, msg = self.create_forward(port)
                 results.append(f"Port {port}: recreated")
             else:
                 # Update service file with current remote IP
-                remote_ip = self.config.remote_forward_ip
-                service_content = SERVICE_TEMPLATE.format(port=port, remote_ip=remote_ip)
-                
-                with open(service_path, 'w') as f:
-                    f.write(service_content)
-                
-                run_command("systemctl daemon-reload")
-                success, output = run_command(f"systemctl restart {service_name}")
+                self._write_service_file(port, remote_ip)
+                existing.append(port)
+        
+        if existing:
+            self._daemon_reload()
+            
+            outcome = self._systemctl_ports("restart", existing)
+            
+            for port in existing:
+                success, output = outcome[port]
                 if success:
                     results.append(f"Port {port}: restarted")
                 else:
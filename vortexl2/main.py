@@ -168,8 +168,10 @@ def handle_delete_tunnel(manager: ConfigManager):
         if config.forwarded_ports:
             ui.show_info("Removing port forwards...")
             ports_to_remove = list(config.forwarded_ports)  # Copy list since we're modifying it
-            for port in ports_to_remove:
-                forward.remove_forward(port)
+            # One config write for all ports, on disk before the teardown starts
+            with config.batch():
+                for port in ports_to_remove:
+                    forward.remove_forward(port)
             ui.show_success(f"Removed {len(ports_to_remove)} port forward(s)")
         
         # Stop tunnel
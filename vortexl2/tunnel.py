@@ -4,34 +4,63 @@ VortexL2 L2TPv3 Tunnel Management
 Handles L2TPv3 tunnel and session creation/deletion using iproute2.
 """
 
+import json
+import os
+import platform
 import subprocess
 import re
-from typing import Optional, Dict, Tuple, List
+import time
+from typing import Optional, Dict, Tuple, List, Set
 from dataclasses import dataclass
 
 
+# Patterns for parsing iproute2 output, compiled once at import
+_TUNNEL_RE = re.compile(r"Tunnel\s+(\d+),")
+_SESSION_RE = re.compile(r"Session\s+(\d+)\s+in\s+tunnel\s+(\d+)")
+
+
 @dataclass
 class CommandResult:
-    """Result of a shell command execution."""
+    """Result of a command execution."""
+    __slots__ = ("success", "stdout", "stderr", "returncode")
+    
     success: bool
     stdout: str
     stderr: str
     returncode: int
 
 
-def run_command(cmd: str, check: bool = False) -> CommandResult:
-    """Execute a shell command and return result."""
+@dataclass
+class _StatusCache:
+    """Parsed `ip l2tp show` state, reused briefly within a single operation."""
+    __slots__ = ("tunnel_ids", "sessions", "timestamp")
+    
+    tunnel_ids: Set[int]
+    sessions: Set[Tuple[int, int]]  # (tunnel_id, session_id)
+    timestamp: float
+
+
+def run_command(argv: List[str], check: bool = False, input: Optional[str] = None,
+                capture: bool = True) -> CommandResult:
+    """
+    Execute a command (argv list, no shell; optionally feeding it stdin) and return result.
+    
+    With capture=False stdout is discarded and only stderr is collected, for
+    commands whose output is only looked at on failure.
+    """
     try:
         result = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
+            argv,
+            shell=False,
+            input=input,
+            stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
             text=True,
             timeout=30
         )
         return CommandResult(
             success=(result.returncode == 0),
-            stdout=result.stdout.strip(),
+            stdout=(result.stdout or "").strip(),
             stderr=result.stderr.strip(),
             returncode=result.returncode
         )
@@ -51,6 +80,33 @@ def run_command(cmd: str, check: bool = False) -> CommandResult:
         )
 
 
+def get_running_tunnel_ids() -> Set[int]:
+    """Get the IDs of all L2TP tunnels currently present in the kernel."""
+    result = run_command(["ip", "l2tp", "show", "tunnel"])
+    if not result.success:
+        return set()
+    return {int(m.group(1)) for m in _TUNNEL_RE.finditer(result.stdout)}
+
+
+def _split_ip_batch_output(output: str) -> Tuple[str, str]:
+    """
+    Split combined `ip -batch` l2tp output into (tunnels, sessions).
+    
+    Each record starts with an unindented "Tunnel ..." or "Session ..."
+    line; indented lines belong to the preceding record.
+    """
+    sections = {"tunnel": [], "session": []}
+    current = None
+    for line in output.splitlines():
+        if line.startswith("Tunnel "):
+            current = "tunnel"
+        elif line.startswith("Session "):
+            current = "session"
+        if current is not None:
+            sections[current].append(line)
+    return "\n".join(sections["tunnel"]), "\n".join(sections["session"])
+
+
 class TunnelManager:
     """Manages L2TPv3 tunnel and session operations for a specific tunnel config."""
     
@@ -62,6 +118,7 @@ class TunnelManager:
             config: TunnelConfig instance for the tunnel to manage
         """
         self.config = config
+        self._status: Optional[_StatusCache] = None
     
     @property
     def interface_name(self) -> str:
@@ -73,24 +130,24 @@ class TunnelManager:
         steps = []
         
         # Get kernel version
-        result = run_command("uname -r")
-        if not result.success:
+        try:
+            with open("/proc/sys/kernel/osrelease") as f:
+                kernel_version = f.read().strip()
+        except OSError:
+            kernel_version = platform.release()
+        if not kernel_version:
             return False, "Failed to get kernel version"
-        kernel_version = result.stdout.strip()
         
         # Install linux-modules-extra
         steps.append(f"Installing linux-modules-extra-{kernel_version}...")
-        result = run_command(f"apt-get install -y linux-modules-extra-{kernel_version}")
+        result = run_command(["apt-get", "install", "-y", f"linux-modules-extra-{kernel_version}"])
         if not result.success:
-            # Try without specific version as fallback
-            result = run_command("apt-get install -y linux-modules-extra-$(uname -r)")
-            if not result.success:
-                steps.append(f"Warning: Could not install modules package: {result.stderr}")
+            steps.append(f"Warning: Could not install modules package: {result.stderr}")
         else:
             steps.append("Package installed successfully")
         
         # Install iproute2 with l2tp support
-        result = run_command("apt-get install -y iproute2")
+        result = run_command(["apt-get", "install", "-y", "iproute2"])
         if not result.success:
             steps.append(f"Warning: Could not install iproute2: {result.stderr}")
         
@@ -98,46 +155,78 @@ class TunnelManager:
         modules = ["l2tp_core", "l2tp_netlink", "l2tp_eth"]
         for module in modules:
             steps.append(f"Loading module {module}...")
-            result = run_command(f"modprobe {module}")
+            result = run_command(["modprobe", module], capture=False)
             if not result.success:
                 return False, f"Failed to load module {module}: {result.stderr}"
             steps.append(f"Module {module} loaded")
         
-        # Verify modules are loaded
-        result = run_command("lsmod | grep l2tp")
-        if "l2tp" not in result.stdout:
-            return False, "L2TP modules not found in lsmod"
+        # Verify modules are loaded (same data lsmod prints)
+        try:
+            with open("/proc/modules") as f:
+                loaded = f.read()
+        except OSError:
+            loaded = ""
+        if "l2tp" not in loaded:
+            return False, "L2TP modules not found in /proc/modules"
         
         steps.append("All prerequisites installed successfully!")
         return True, "\n".join(steps)
     
-    def check_tunnel_exists(self, tunnel_id: int = None) -> bool:
-        """Check if L2TP tunnel exists."""
+    def _refresh_status(self, ttl: float = 0.5) -> _StatusCache:
+        """Get current tunnel/session IDs, re-querying `ip` only if the cache is older than ttl."""
+        now = time.monotonic()
+        if self._status is None or now - self._status.timestamp > ttl:
+            result = run_command(
+                ["ip", "-force", "-batch", "-"],
+                input="l2tp show tunnel\nl2tp show session\n"
+            )
+            tunnel_info, session_info = _split_ip_batch_output(result.stdout)
+            self._status = _StatusCache(
+                tunnel_ids={int(m.group(1)) for m in _TUNNEL_RE.finditer(tunnel_info)},
+                sessions={
+                    (int(m.group(2)), int(m.group(1)))
+                    for m in _SESSION_RE.finditer(session_info)
+                },
+                timestamp=now,
+            )
+        return self._status
+    
+    def _invalidate_status(self) -> None:
+        """Drop cached tunnel/session state after changing it."""
+        self._status = None
+    
+    def check_tunnel_exists(self, tunnel_id: int = None, output: Optional[str] = None) -> bool:
+        """Check if L2TP tunnel exists (optionally in already-fetched `ip l2tp show tunnel` output)."""
         if tunnel_id is None:
             tunnel_id = self.config.tunnel_id
         
-        result = run_command("ip l2tp show tunnel")
-        if not result.success:
-            return False
+        tunnel_id = int(tunnel_id)
+        if output is None:
+            return tunnel_id in self._refresh_status().tunnel_ids
         
         # Parse output for tunnel_id
-        pattern = rf"Tunnel\s+{tunnel_id},"
-        return bool(re.search(pattern, result.stdout))
+        return any(
+            int(m.group(1)) == tunnel_id
+            for m in _TUNNEL_RE.finditer(output)
+        )
     
-    def check_session_exists(self, tunnel_id: int = None, session_id: int = None) -> bool:
-        """Check if L2TP session exists."""
+    def check_session_exists(self, tunnel_id: int = None, session_id: int = None,
+                             output: Optional[str] = None) -> bool:
+        """Check if L2TP session exists (optionally in already-fetched `ip l2tp show session` output)."""
         if tunnel_id is None:
             tunnel_id = self.config.tunnel_id
         if session_id is None:
             session_id = self.config.session_id
         
-        result = run_command("ip l2tp show session")
-        if not result.success:
-            return False
+        tunnel_id, session_id = int(tunnel_id), int(session_id)
+        if output is None:
+            return (tunnel_id, session_id) in self._refresh_status().sessions
         
         # Parse output for session_id in tunnel
-        pattern = rf"Session\s+{session_id}\s+in\s+tunnel\s+{tunnel_id}"
-        return bool(re.search(pattern, result.stdout))
+        return any(
+            int(m.group(1)) == session_id and int(m.group(2)) == tunnel_id
+            for m in _SESSION_RE.finditer(output)
+        )
     
     def create_tunnel(self) -> Tuple[bool, str]:
         """Create L2TP tunnel based on configuration."""
@@ -149,16 +238,17 @@ class TunnelManager:
         if self.check_tunnel_exists():
             return False, f"Tunnel {ids['tunnel_id']} already exists. Delete it first or use recreate."
         
-        cmd = (
-            f"ip l2tp add tunnel "
-            f"tunnel_id {ids['tunnel_id']} "
-            f"peer_tunnel_id {ids['peer_tunnel_id']} "
-            f"encap ip "
-            f"local {self.config.local_ip} "
-            f"remote {self.config.remote_ip}"
-        )
-        
-        result = run_command(cmd)
+        cmd = [
+            "ip", "l2tp", "add", "tunnel",
+            "tunnel_id", str(ids['tunnel_id']),
+            "peer_tunnel_id", str(ids['peer_tunnel_id']),
+            "encap", "ip",
+            "local", self.config.local_ip,
+            "remote", self.config.remote_ip,
+        ]
+        
+        result = run_command(cmd, capture=False)
+        self._invalidate_status()
         if not result.success:
             return False, f"Failed to create tunnel: {result.stderr}"
         
@@ -174,26 +264,36 @@ class TunnelManager:
         if self.check_session_exists():
             return False, f"Session {ids['session_id']} already exists"
         
-        cmd = (
-            f"ip l2tp add session "
-            f"tunnel_id {ids['tunnel_id']} "
-            f"session_id {ids['session_id']} "
-            f"peer_session_id {ids['peer_session_id']}"
-        )
+        cmd = [
+            "ip", "l2tp", "add", "session",
+            "tunnel_id", str(ids['tunnel_id']),
+            "session_id", str(ids['session_id']),
+            "peer_session_id", str(ids['peer_session_id']),
+        ]
         
-        result = run_command(cmd)
+        result = run_command(cmd, capture=False)
+        self._invalidate_status()
         if not result.success:
             return False, f"Failed to create session: {result.stderr}"
         
         return True, f"Session {ids['session_id']} created successfully"
     
+    def _wait_for_iface(self, timeout: float = 2.0, interval: float = 0.02) -> bool:
+        """Poll sysfs until the tunnel interface appears (or timeout expires)."""
+        deadline = time.monotonic() + timeout
+        path = f"/sys/class/net/{self.interface_name}"
+        while time.monotonic() < deadline:
+            if os.path.exists(path):
+                return True
+            time.sleep(interval)
+        return os.path.exists(path)
+    
     def bring_up_interface(self) -> Tuple[bool, str]:
         """Bring up the tunnel interface."""
-        # Wait a moment for interface to appear
-        import time
-        time.sleep(0.5)
+        # Wait for interface to appear after session creation
+        self._wait_for_iface()
         
-        result = run_command(f"ip link set {self.interface_name} up")
+        result = run_command(["ip", "link", "set", self.interface_name, "up"], capture=False)
         if not result.success:
             return False, f"Failed to bring up interface: {result.stderr}"
         
@@ -203,15 +303,12 @@ class TunnelManager:
         """Assign IP address to tunnel interface."""
         ip_cidr = self.config.interface_ip
         
-        # Check if IP already assigned
-        result = run_command(f"ip addr show {self.interface_name}")
-        if ip_cidr.split('/')[0] in result.stdout:
-            return True, f"IP {ip_cidr} already assigned"
-        
-        result = run_command(f"ip addr add {ip_cidr} dev {self.interface_name}")
+        # Just try to add; an existing address is reported as EEXIST
+        result = run_command(["ip", "addr", "add", ip_cidr, "dev", self.interface_name], capture=False)
         if not result.success:
-            # Check if it's because address exists
-            if "RTNETLINK answers: File exists" in result.stderr:
+            # Check if it's because address exists (older iproute2 prints
+            # "RTNETLINK answers: File exists", newer "Address already assigned")
+            if "File exists" in result.stderr or "already assigned" in result.stderr:
                 return True, f"IP {ip_cidr} already assigned"
             return False, f"Failed to assign IP: {result.stderr}"
         
@@ -224,8 +321,13 @@ class TunnelManager:
         if not self.check_session_exists():
             return True, "Session does not exist (already deleted)"
         
-        cmd = f"ip l2tp del session tunnel_id {ids['tunnel_id']} session_id {ids['session_id']}"
-        result = run_command(cmd)
+        cmd = [
+            "ip", "l2tp", "del", "session",
+            "tunnel_id", str(ids['tunnel_id']),
+            "session_id", str(ids['session_id']),
+        ]
+        result = run_command(cmd, capture=False)
+        self._invalidate_status()
         if not result.success:
             return False, f"Failed to delete session: {result.stderr}"
         
@@ -244,8 +346,9 @@ class TunnelManager:
         if not self.check_tunnel_exists():
             return True, "Tunnel does not exist (already deleted)"
         
-        cmd = f"ip l2tp del tunnel tunnel_id {ids['tunnel_id']}"
-        result = run_command(cmd)
+        cmd = ["ip", "l2tp", "del", "tunnel", "tunnel_id", str(ids['tunnel_id'])]
+        result = run_command(cmd, capture=False)
+        self._invalidate_status()
         if not result.success:
             return False, f"Failed to delete tunnel: {result.stderr}"
         
@@ -320,24 +423,35 @@ class TunnelManager:
             "interface_info": "",
         }
         
+        # Query tunnels and sessions in a single `ip` process
+        result = run_command(
+            ["ip", "-force", "-batch", "-"],
+            input="l2tp show tunnel\nl2tp show session\n"
+        )
+        tunnel_info, session_info = _split_ip_batch_output(result.stdout)
+        
         # Check tunnel
-        result = run_command("ip l2tp show tunnel")
-        status["tunnel_info"] = result.stdout if result.success else result.stderr
-        status["tunnel_exists"] = self.check_tunnel_exists()
+        status["tunnel_info"] = tunnel_info
+        status["tunnel_exists"] = self.check_tunnel_exists(output=tunnel_info)
         
         # Check session
-        result = run_command("ip l2tp show session")
-        status["session_info"] = result.stdout if result.success else result.stderr
-        status["session_exists"] = self.check_session_exists()
-        
-        # Check interface
-        result = run_command(f"ip addr show {self.interface_name} 2>/dev/null")
-        if result.success and result.stdout:
+        status["session_info"] = session_info
+        status["session_exists"] = self.check_session_exists(output=session_info)
+        
+        # Check interface (structured JSON output instead of scraping text)
+        result = run_command(["ip", "-j", "addr", "show", self.interface_name])
+        try:
+            links = json.loads(result.stdout or "[]") if result.success else []
+        except ValueError:
+            links = []
+        if links:
+            link = links[0]
             status["interface_info"] = result.stdout
-            status["interface_up"] = "UP" in result.stdout
+            status["interface_up"] = "UP" in link.get("flags", [])
             # Extract IP
-            ip_match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+/\d+)', result.stdout)
-            if ip_match:
-                status["interface_ip"] = ip_match.group(1)
+            for addr in link.get("addr_info", []):
+                if addr.get("family") == "inet":
+                    status["interface_ip"] = f"{addr['local']}/{addr['prefixlen']}"
+                    break
         
         return status
@@ -4,7 +4,9 @@ VortexL2 Terminal User Interface
 Rich-based TUI with ASCII banner and menu system.
 """
 
+import ipaddress
 import os
+import string
 import sys
 import re
 from typing import Optional, List
@@ -28,21 +30,16 @@ console = Console()
 
 
 def is_valid_ip(ip: str) -> bool:
-    """Validate IPv4 address format."""
+    """Validate IPv4 address format (optionally with CIDR prefix)."""
     if not ip:
         return False
-    # Remove CIDR if present
-    ip_only = ip.split('/')[0]
-    parts = ip_only.split('.')
-    if len(parts) != 4:
-        return False
     try:
-        for part in parts:
-            num = int(part)
-            if num < 0 or num > 255:
-                return False
+        if "/" in ip:
+            ipaddress.IPv4Interface(ip)
+        else:
+            ipaddress.IPv4Address(ip)
         return True
-    except ValueError:
+    except ValueError:  # includes AddressValueError / NetmaskValueError
         return False
 
 
@@ -73,40 +70,39 @@ ASCII_BANNER = r"""
 
 def clear_screen():
     """Clear terminal screen."""
-    os.system('clear' if os.name != 'nt' else 'cls')
+    if os.name == 'nt':
+        os.system('cls')
+        return
+    # ANSI clear + cursor home; avoids forking /bin/sh and clear on every redraw
+    sys.stdout.write("\x1b[2J\x1b[H")
+    sys.stdout.flush()
+
+
+# Banner renderables are constant, so build them once at import
+_BANNER_TEXT = Text(ASCII_BANNER, style="bold cyan")
+
+_DEV_PANEL = Panel(
+    f"[bold white]Telegram:[/] [cyan]@iliyadevsh[/]  |  [bold white]Version:[/] [red]{__version__}[/]  |  [bold white]GitHub:[/] [cyan]github.com/iliya-Developer[/]",
+    title="[bold white]VortexL2 - L2TPv3 Tunnel Manager[/]",
+    border_style="cyan",
+    box=box.ROUNDED
+)
 
 
 def show_banner():
     """Display the ASCII banner with developer info."""
     clear_screen()
     
-    banner_text = Text(ASCII_BANNER, style="bold cyan")
-    
     # Print banner
-    console.print(banner_text)
+    console.print(_BANNER_TEXT)
     
     # Developer info bar
-    console.print(Panel(
-        f"[bold white]Telegram:[/] [cyan]@iliyadevsh[/]  |  [bold white]Version:[/] [red]{__version__}[/]  |  [bold white]GitHub:[/] [cyan]github.com/iliya-Developer[/]",
-        title="[bold white]VortexL2 - L2TPv3 Tunnel Manager[/]",
-        border_style="cyan",
-        box=box.ROUNDED
-    ))
+    console.print(_DEV_PANEL)
     console.print()
 
 
-def show_main_menu() -> str:
-    """Display main menu and get user choice."""
-    menu_items = [
-        ("1", "Install/Verify Prerequisites"),
-        ("2", "Create Tunnel"),
-        ("3", "Delete Tunnel"),
-        ("4", "List Tunnels"),
-        ("5", "Port Forwards"),
-        ("6", "View Logs"),
-        ("0", "Exit"),
-    ]
-    
+def _build_menu_table(menu_items: List[tuple]) -> Table:
+    """Build the option/description table for a menu."""
     table = Table(show_header=False, box=box.SIMPLE, padding=(0, 2))
     table.add_column("Option", style="bold cyan", width=4)
     table.add_column("Description", style="white")
@@ -114,14 +110,26 @@ def show_main_menu() -> str:
     for opt, desc in menu_items:
         table.add_row(f"[{opt}]", desc)
     
-    console.print(Panel(table, title="[bold white]Main Menu[/]", border_style="blue"))
-    
-    return Prompt.ask("\n[bold cyan]Select option[/]", default="0")
+    return table
 
 
-def show_forwards_menu() -> str:
-    """Display forwards submenu."""
-    menu_items = [
+# Menus never change, so build their renderables once at import
+_MAIN_MENU_PANEL = Panel(
+    _build_menu_table([
+        ("1", "Install/Verify Prerequisites"),
+        ("2", "Create Tunnel"),
+        ("3", "Delete Tunnel"),
+        ("4", "List Tunnels"),
+        ("5", "Port Forwards"),
+        ("6", "View Logs"),
+        ("0", "Exit"),
+    ]),
+    title="[bold white]Main Menu[/]",
+    border_style="blue"
+)
+
+_FORWARDS_MENU_PANEL = Panel(
+    _build_menu_table([
         ("1", "Add Port Forwards"),
         ("2", "Remove Port Forwards"),
         ("3", "List Port Forwards"),
@@ -129,23 +137,29 @@ def show_forwards_menu() -> str:
         ("5", "Stop All Forwards"),
         ("6", "Start All Forwards"),
         ("0", "Back to Main Menu"),
-    ]
-    
-    table = Table(show_header=False, box=box.SIMPLE, padding=(0, 2))
-    table.add_column("Option", style="bold cyan", width=4)
-    table.add_column("Description", style="white")
-    
-    for opt, desc in menu_items:
-        table.add_row(f"[{opt}]", desc)
+    ]),
+    title="[bold white]Port Forwards[/]",
+    border_style="green"
+)
+
+
+def show_main_menu() -> str:
+    """Display main menu and get user choice."""
+    console.print(_MAIN_MENU_PANEL)
     
-    console.print(Panel(table, title="[bold white]Port Forwards[/]", border_style="green"))
+    return Prompt.ask("\n[bold cyan]Select option[/]", default="0")
+
+
+def show_forwards_menu() -> str:
+    """Display forwards submenu."""
+    console.print(_FORWARDS_MENU_PANEL)
     
     return Prompt.ask("\n[bold cyan]Select option[/]", default="0")
 
 
 def show_tunnel_list(manager: ConfigManager):
     """Display list of all configured tunnels with status."""
-    from .tunnel import TunnelManager
+    from .tunnel import get_running_tunnel_ids
     
     tunnels = manager.get_all_tunnels()
     
@@ -162,9 +176,11 @@ def show_tunnel_list(manager: ConfigManager):
     table.add_column("Tunnel ID", style="white")
     table.add_column("Status", style="white")
     
+    # One `ip l2tp show tunnel` for the whole table instead of one per row
+    running_ids = get_running_tunnel_ids()
+    
     for i, config in enumerate(tunnels, 1):
-        tunnel_mgr = TunnelManager(config)
-        is_running = tunnel_mgr.check_tunnel_exists()
+        is_running = int(config.tunnel_id) in running_ids
         status = "[green]Running[/]" if is_running else "[red]Stopped[/]"
         
         table.add_row(
@@ -180,13 +196,23 @@ def show_tunnel_list(manager: ConfigManager):
     console.print(table)
 
 
+class _NameTable(dict):
+    """str.translate table: keep [a-z0-9-], map every other character to '-'."""
+    
+    def __missing__(self, key: int) -> str:
+        return "-"
+
+
+_NAME_TABLE = _NameTable({ord(c): c for c in string.ascii_lowercase + string.digits + "-"})
+
+
 def prompt_tunnel_name() -> Optional[str]:
     """Prompt for new tunnel name."""
     console.print("\n[dim]Enter a unique name for the tunnel (alphanumeric and dashes only)[/]")
     name = Prompt.ask("[bold magenta]Tunnel Name[/]", default="tunnel1")
     
     # Sanitize name
-    name = "".join(c if c.isalnum() or c == "-" else "-" for c in name.lower())
+    name = name.lower().translate(_NAME_TABLE)
     return name if name else None
 
 